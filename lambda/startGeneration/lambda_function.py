@@ -1,13 +1,24 @@
 import json
 import os
 import boto3
-import uuid
+import orjson
+import secrets
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 import time
+from decimal import Decimal
 from auth import get_user_id_from_event, create_unauthorized_response, create_forbidden_response, CORS_HEADERS
 
 # Initialize clients
-dynamodb = boto3.resource('dynamodb')
-lambda_client = boto3.client('lambda')
+# tcp_keepalive keeps the AWS-side connections alive across warm invocations
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=10, retries={'max_attempts': 2, 'mode': 'standard'})
+
+dynamodb = boto3.resource('dynamodb', config=_BOTO_CONFIG)
+lambda_client = boto3.client('lambda', config=_BOTO_CONFIG)
+
+# Overlaps the job write with the async invoke on the user-facing path
+executor = ThreadPoolExecutor(max_workers=2)
 
 # Environment variables
 GENERATION_JOBS_TABLE = os.environ.get('GENERATION_JOBS_TABLE')
@@ -15,6 +26,31 @@ PROCESS_GENERATION_FUNCTION_NAME = os.environ.get('PROCESS_GENERATION_FUNCTION_N
 SUMMARIES_TABLE = os.environ.get('SUMMARIES_TABLE')  # To verify user owns the file
 USER_PROFILES_TABLE = os.environ.get('USER_PROFILES_TABLE')  # To check user credits
 
+# Low-level client shared with the resource: hot-path calls use it directly
+# with pre-marshaled AttributeValues, skipping the resource layer's per-call
+# type serialization (same split processGeneration uses)
+ddb_client = dynamodb.meta.client
+
+# Unmarshals the low-level AttributeValue items returned by batch_get_item
+_deserializer = TypeDeserializer()
+
+# Open the DynamoDB TLS session during INIT so the first request doesn't pay
+# the handshake; keepalive keeps the socket warm for later invocations
+try:
+    ddb_client.describe_table(TableName=GENERATION_JOBS_TABLE)
+except Exception:
+    pass
+
+def decimal_to_number(obj):
+    """Convert DynamoDB Decimal values so the profile can be JSON-serialized."""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    elif isinstance(obj, dict):
+        return {k: decimal_to_number(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [decimal_to_number(i) for i in obj]
+    return obj
+
 def lambda_handler(event, context):
     """
     Handles the initial request to generate documents.
@@ -31,7 +67,7 @@ def lambda_handler(event, context):
 
     try:
         # Parse request body
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(event.get('body') or '{}')
 
         file_id = body.get('fileId')
         job_description = body.get('jobDescription')
@@ -40,38 +76,51 @@ def lambda_handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": CORS_HEADERS,
-                "body": json.dumps({"error": "fileId and jobDescription are required"})
+                "body": orjson.dumps({"error": "fileId and jobDescription are required"}).decode()
             }
 
-        # ===== AUTHORIZATION CHECK =====
-        # Verify user owns the file they're trying to generate documents for
-        summaries_table = dynamodb.Table(SUMMARIES_TABLE)
+        # ===== AUTHORIZATION + CREDIT CHECK =====
+        # One BatchGetItem covers both reads in a single round trip: the file
+        # ownership record (userId only) and the user profile. The profile is
+        # fetched whole because it is forwarded to processGeneration.
+        profile_data = None  # Forwarded to processGeneration to save it a re-fetch
         try:
-            file_response = summaries_table.get_item(Key={'fileId': file_id})
-            if 'Item' not in file_response:
-                print(f"File not found: {file_id}")
-                return {
-                    "statusCode": 404,
-                    "headers": CORS_HEADERS,
-                    "body": json.dumps({"error": "File not found"})
-                }
-
-            # Check if the file belongs to the authenticated user
-            file_owner = file_response['Item'].get('userId')
-            if file_owner and file_owner != user_id:
-                print(f"User {user_id} tried to access file {file_id} owned by {file_owner}")
-                return create_forbidden_response("You don't have permission to access this file")
-        except Exception as e:
-            print(f"Error checking file ownership: {e}")
-            # Continue anyway if summaries table doesn't have the record yet (for backwards compatibility)
+            batch_response = ddb_client.batch_get_item(RequestItems={
+                SUMMARIES_TABLE: {
+                    'Keys': [{'fileId': {'S': file_id}}],
+                    'ProjectionExpression': 'userId',
+                },
+                USER_PROFILES_TABLE: {
+                    'Keys': [{'userId': {'S': user_id}}],
+                },
+            })
+            responses = batch_response.get('Responses', {})
+            unprocessed = batch_response.get('UnprocessedKeys') or {}
+
+            # Verify user owns the file they're trying to generate documents for
+            if SUMMARIES_TABLE not in unprocessed:
+                file_items = responses.get(SUMMARIES_TABLE, [])
+                if not file_items:
+                    print(f"File not found: {file_id}")
+                    return {
+                        "statusCode": 404,
+                        "headers": CORS_HEADERS,
+                        "body": orjson.dumps({"error": "File not found"}).decode()
+                    }
 
-        # ===== CREDIT CHECK =====
-        # Verify user has sufficient credits before starting generation
-        user_profiles_table = dynamodb.Table(USER_PROFILES_TABLE)
-        try:
-            profile_response = user_profiles_table.get_item(Key={'userId': user_id})
-            if 'Item' in profile_response:
-                profile = profile_response['Item']
+                file_owner = file_items[0].get('userId', {}).get('S')
+                if file_owner and file_owner != user_id:
+                    print(f"User {user_id} tried to access file {file_id} owned by {file_owner}")
+                    return create_forbidden_response("You don't have permission to access this file")
+            else:
+                # Continue anyway if the read was throttled (for backwards compatibility)
+                print(f"Ownership read unprocessed for file {file_id}, continuing")
+
+            # Verify user has sufficient credits before starting generation
+            profile_items = responses.get(USER_PROFILES_TABLE, [])
+            if profile_items:
+                profile = {k: _deserializer.deserialize(v) for k, v in profile_items[0].items()}
+                profile_data = decimal_to_number(profile)
                 credits_remaining = int(profile.get('creditsRemaining', 1))
 
                 if credits_remaining <= 0:
@@ -79,66 +128,74 @@ def lambda_handler(event, context):
                     return {
                         "statusCode": 403,
                         "headers": CORS_HEADERS,
-                        "body": json.dumps({
+                        "body": orjson.dumps({
                             "error": "Insufficient credits",
                             "message": "You have no credits remaining. Please purchase more credits to continue.",
                             "creditsRemaining": 0
-                        })
+                        }).decode()
                     }
 
                 print(f"User {user_id} has {credits_remaining} credits remaining")
+            elif USER_PROFILES_TABLE in unprocessed:
+                print(f"Profile read unprocessed for user {user_id}, allowing generation")
             else:
                 # No profile found - allow generation with default 1 free credit
                 # Profile will be created in processGeneration Lambda with creditsRemaining=0 (1 free - 1 used)
                 print(f"No profile found for user {user_id}, allowing generation with default 1 free credit")
         except Exception as e:
-            print(f"Error checking credits: {e}")
-            # Fail open for backwards compatibility - allow generation if credit check fails
-            print("Allowing generation despite credit check error")
-
-        # Generate unique job ID
-        job_id = str(uuid.uuid4())
-
-        # Calculate TTL (24 hours from now)
-        ttl = int(time.time()) + 86400
-
-        # Create job entry in DynamoDB
-        table = dynamodb.Table(GENERATION_JOBS_TABLE)
-        table.put_item(Item={
+            print(f"Error checking file ownership/credits: {e}")
+            # Fail open for backwards compatibility - allow generation if the check fails
+            print("Allowing generation despite check error")
+
+        # Generate unique job ID (hex token: same 128 bits of entropy as a
+        # UUID4 without the dash formatting, and 4 chars shorter as a key)
+        job_id = secrets.token_hex(16)
+
+        # Calculate TTL (24 hours from now); one clock read serves both fields
+        now = int(time.time())
+        ttl = now + 86400
+
+        # Kick off the job write in the background and build the invoke
+        # payload while it flies, but wait for the write to land before
+        # invoking: processGeneration's completion update is conditional on
+        # the job row, so a fast processor (cache hit) must not race ahead
+        # of the put and leave the job stuck in PROCESSING.
+        # The job row and the invoke payload share these fields; build them once
+        job_fields = {
             'jobId': job_id,
             'userId': user_id,  # Store userId for data isolation
             'fileId': file_id,
             'jobDescription': job_description,
-            'status': 'PROCESSING',
-            'createdAt': int(time.time()),
-            'ttl': ttl
+        }
+        put_future = executor.submit(ddb_client.put_item, TableName=GENERATION_JOBS_TABLE, Item={
+            **{k: {'S': v} for k, v in job_fields.items()},
+            'status': {'S': 'PROCESSING'},
+            'createdAt': {'N': str(now)},
+            'ttl': {'N': str(ttl)}
         })
-
-        print(f"Created generation job: {job_id} for user: {user_id}")
-
-        # Invoke processing Lambda asynchronously
+        # boto3 accepts bytes for Payload, so skip the decode-to-str round trip
+        payload = orjson.dumps({
+            **job_fields,
+            'profileData': profile_data  # Already fetched for the credit check
+        })
+        put_future.result()
         lambda_client.invoke(
             FunctionName=PROCESS_GENERATION_FUNCTION_NAME,
             InvocationType='Event',  # Async invocation
-            Payload=json.dumps({
-                'jobId': job_id,
-                'userId': user_id,  # Pass userId to processing Lambda
-                'fileId': file_id,
-                'jobDescription': job_description
-            })
+            Payload=payload
         )
 
-        print(f"Invoked processing Lambda for job: {job_id}")
+        print(f"Created generation job {job_id} and invoked processing Lambda")
 
         # Return jobId immediately
         return {
             "statusCode": 200,
             "headers": CORS_HEADERS,
-            "body": json.dumps({
+            "body": orjson.dumps({
                 "jobId": job_id,
                 "status": "PROCESSING",
                 "message": "Document generation started. Use jobId to poll for status."
-            })
+            }).decode()
         }
 
     except Exception as e:
@@ -146,5 +203,5 @@ def lambda_handler(event, context):
         return {
             "statusCode": 500,
             "headers": CORS_HEADERS,
-            "body": json.dumps({"error": f"Failed to start generation: {str(e)}"})
+            "body": orjson.dumps({"error": f"Failed to start generation: {str(e)}"}).decode()
         }
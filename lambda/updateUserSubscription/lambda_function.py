@@ -1,27 +1,88 @@
 import json
 import os
+import time
 import boto3
+import orjson
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
 from datetime import datetime
 from decimal import Decimal
+from svix.webhooks import Webhook, WebhookVerificationError
 
 # Initialize AWS clients
-dynamodb = boto3.resource('dynamodb')
-table = dynamodb.Table(os.environ['USER_PROFILES_TABLE'])
-
-def decimal_to_number(obj):
-    """Convert DynamoDB Decimal types to int or float for JSON serialization"""
-    if isinstance(obj, list):
-        return [decimal_to_number(i) for i in obj]
-    elif isinstance(obj, dict):
-        return {k: decimal_to_number(v) for k, v in obj.items()}
-    elif isinstance(obj, Decimal):
-        # Convert to int if no decimal places, otherwise float
-        if obj % 1 == 0:
-            return int(obj)
-        else:
-            return float(obj)
-    else:
-        return obj
+# tcp_keepalive keeps the AWS-side connections alive across warm invocations
+_BOTO_CONFIG = Config(tcp_keepalive=True, max_pool_connections=10, retries={'max_attempts': 2, 'mode': 'standard'})
+
+# Low-level client with hand-marshaled AttributeValues: the profile schema is
+# fixed, so skipping the resource layer's per-call type conversion is free
+# (same split processGeneration uses)
+ddb_client = boto3.client('dynamodb', config=_BOTO_CONFIG)
+ssm = boto3.client('ssm', config=_BOTO_CONFIG)
+
+USER_PROFILES_TABLE = os.environ['USER_PROFILES_TABLE']
+
+# Unmarshals the ALL_NEW attributes for the response body
+_deserializer = TypeDeserializer()
+
+# /tmp survives sandbox reuse, so back-to-back cold starts in the same microVM
+# can skip the SSM + KMS round-trip entirely
+SSM_CACHE_FILE = '/tmp/ssm_cache.json'
+SSM_CACHE_TTL_SECONDS = 3600
+
+WEBHOOK_SECRET_PARAM = '/pdf-summarizer/dodo-webhook-secret'
+
+def get_ssm_parameters(parameter_names):
+    """Helper function to get SecureString parameters from SSM in one batched
+    call, with a TTL'd /tmp write-through cache in front of it.
+    Returns a dict of name -> value."""
+    cached = {}
+    try:
+        if time.time() - os.path.getmtime(SSM_CACHE_FILE) < SSM_CACHE_TTL_SECONDS:
+            with open(SSM_CACHE_FILE) as f:
+                cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    missing = [name for name in parameter_names if name not in cached]
+    if missing:
+        response = ssm.get_parameters(Names=missing, WithDecryption=True)
+        if response.get('InvalidParameters'):
+            raise ValueError(f"Missing SSM parameters: {response['InvalidParameters']}")
+        for parameter in response['Parameters']:
+            cached[parameter['Name']] = parameter['Value']
+        try:
+            fd = os.open(SSM_CACHE_FILE, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cached, f)
+        except OSError as cache_error:
+            print(f"Could not write SSM cache: {cache_error}")
+
+    return {name: cached[name] for name in parameter_names}
+
+# Dodo signs webhooks in the standard-webhooks (svix) format. The secret is
+# fetched once per container; if it can't be loaded we log and fall back to
+# the old unverified behavior rather than dropping real purchases.
+try:
+    WEBHOOK_SECRET = get_ssm_parameters([WEBHOOK_SECRET_PARAM])[WEBHOOK_SECRET_PARAM]
+except Exception as e:
+    print(f"Could not load webhook secret: {e}")
+    WEBHOOK_SECRET = None
+
+# One verifier per container: Webhook() base64-decodes the secret and builds
+# the HMAC key, no need to redo that per invocation
+WEBHOOK_VERIFIER = Webhook(WEBHOOK_SECRET) if WEBHOOK_SECRET else None
+
+# Static response headers built once; every return references the same dict
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+def _decimal_default(obj):
+    """Let orjson serialize DynamoDB Decimal values as int or float"""
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError
 
 def lambda_handler(event, context):
     """
@@ -40,8 +101,69 @@ def lambda_handler(event, context):
     """
 
     try:
+        payload = event.get('body') or ''
+
+        # Real Dodo payloads are well under a kilobyte; cap the body before
+        # any HMAC or JSON work so oversized junk costs nothing to reject
+        if len(payload) > 65536:
+            return {
+                'statusCode': 413,
+                'headers': CORS_HEADERS,
+                'body': orjson.dumps({
+                    'error': 'Payload too large'
+                }).decode()
+            }
+
+        # ===== SIGNATURE VERIFICATION =====
+        # Reject forged requests before any parsing or DynamoDB work; a fake
+        # webhook must never be able to grant credits
+        if WEBHOOK_VERIFIER:
+            # Cheap O(1) rejects ahead of the HMAC pass: timestamps outside
+            # svix's 5-minute tolerance are replays or garbage either way
+            if not payload:
+                return {
+                    'statusCode': 400,
+                    'headers': CORS_HEADERS,
+                    'body': orjson.dumps({
+                        'error': 'Invalid webhook body'
+                    }).decode()
+                }
+
+            # REST APIs pass headers through with original casing; one
+            # lowercasing pass handles any variant
+            headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+
+            webhook_timestamp = headers.get('webhook-timestamp') or ''
+            if not webhook_timestamp.isdigit() or abs(time.time() - int(webhook_timestamp)) > 300:
+                print("Webhook timestamp missing or outside tolerance")
+                return {
+                    'statusCode': 401,
+                    'headers': CORS_HEADERS,
+                    'body': orjson.dumps({
+                        'error': 'Invalid webhook signature'
+                    }).decode()
+                }
+
+            try:
+                WEBHOOK_VERIFIER.verify(payload, {
+                    'webhook-id': headers.get('webhook-id'),
+                    'webhook-signature': headers.get('webhook-signature'),
+                    'webhook-timestamp': headers.get('webhook-timestamp'),
+                })
+            except WebhookVerificationError:
+                print("Webhook signature verification failed")
+                return {
+                    'statusCode': 401,
+                    'headers': CORS_HEADERS,
+                    'body': orjson.dumps({
+                        'error': 'Invalid webhook signature'
+                    }).decode()
+                }
+        else:
+            print("Webhook secret unavailable, skipping signature verification")
+
         # Parse request body (simplified webhook handling following Dodo demo pattern)
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(payload or '{}')
 
         # Extract userId (required)
         user_id = body.get('userId')
@@ -49,26 +171,20 @@ def lambda_handler(event, context):
         if not user_id:
             return {
                 'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                },
-                'body': json.dumps({
+                'headers': CORS_HEADERS,
+                'body': orjson.dumps({
                     'error': 'Missing required field: userId'
-                })
+                }).decode()
             }
 
         # Validate required fields for credit purchase
         if 'credits' not in body or 'productId' not in body:
             return {
                 'statusCode': 400,
-                'headers': {
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Headers': 'Content-Type',
-                },
-                'body': json.dumps({
+                'headers': CORS_HEADERS,
+                'body': orjson.dumps({
                     'error': 'Missing required fields: credits and productId'
-                })
+                }).decode()
             }
 
         credits_to_add = int(body['credits'])
@@ -78,89 +194,94 @@ def lambda_handler(event, context):
 
         print(f"Processing credit pack purchase for user {user_id}: {credits_to_add} credits")
 
-        # Get existing profile or create new one
-        response = table.get_item(Key={'userId': user_id})
+        # Single atomic UpdateItem replaces the GET-then-PUT cycle: one round
+        # trip instead of two, untouched attributes persist automatically, and
+        # concurrent webhook deliveries can no longer overwrite each other's
+        # credit math. New users start from the 1 free credit, matching the
+        # old create path.
+        now_iso = datetime.utcnow().isoformat()
 
-        if 'Item' not in response:
-            # First-time purchaser - create new profile (this should rarely happen now)
-            current_credits = 1  # Start with free credit
-            total_purchased = 0
-            existing_item = {}
-            print(f"Creating new profile for user {user_id}")
-        else:
-            # Existing user - preserve all existing fields
-            existing_item = response['Item']
-            current_credits = int(existing_item.get('creditsRemaining', 1))
-            total_purchased = int(existing_item.get('totalCreditsPurchased', 0))
-
-        # Calculate new balances
-        new_credits = current_credits + credits_to_add
-        new_total_purchased = total_purchased + credits_to_add
-
-        # Start with existing profile data to preserve all fields
-        profile_item = dict(existing_item) if existing_item else {}
-
-        # Update/add credit-related fields
-        profile_item['userId'] = user_id
-        profile_item['creditsRemaining'] = new_credits
-        profile_item['totalCreditsPurchased'] = new_total_purchased
-        profile_item['lastPurchaseProductId'] = product_id
-        profile_item['lastPurchaseCredits'] = credits_to_add
-        profile_item['lastPurchaseAmount'] = amount
-        profile_item['lastPurchaseDate'] = datetime.utcnow().isoformat()
-        profile_item['lastPaymentId'] = payment_id
-        profile_item['updatedAt'] = datetime.utcnow().isoformat()
-
-        # Keep createdAt if it exists
-        if 'createdAt' not in profile_item:
-            profile_item['createdAt'] = datetime.utcnow().isoformat()
+        update_expression = (
+            'SET creditsRemaining = if_not_exists(creditsRemaining, :free) + :credits, '
+            'totalCreditsPurchased = if_not_exists(totalCreditsPurchased, :zero) + :credits, '
+            'lastPurchaseProductId = :productId, '
+            'lastPurchaseCredits = :credits, '
+            'lastPurchaseAmount = :amount, '
+            'lastPurchaseDate = :now, '
+            'lastPaymentId = :paymentId, '
+            'updatedAt = :now, '
+            'createdAt = if_not_exists(createdAt, :now)'
+        )
+        expr_values = {
+            ':credits': {'N': str(credits_to_add)},
+            ':free': {'N': '1'},
+            ':zero': {'N': '0'},
+            ':productId': {'S': product_id},
+            ':amount': {'N': str(amount)},
+            ':now': {'S': now_iso},
+            ':paymentId': {'S': payment_id},
+        }
 
         # Store customer ID if provided
         if 'dodoCustomerId' in body:
-            profile_item['dodoCustomerId'] = body['dodoCustomerId']
+            update_expression += ', dodoCustomerId = :dodoCustomerId'
+            expr_values[':dodoCustomerId'] = {'S': body['dodoCustomerId']}
 
-        # Save to DynamoDB
-        table.put_item(Item=profile_item)
+        update_kwargs = {
+            'TableName': USER_PROFILES_TABLE,
+            'Key': {'userId': {'S': user_id}},
+            'UpdateExpression': update_expression,
+            'ExpressionAttributeValues': expr_values,
+            'ReturnValues': 'ALL_NEW',
+        }
+        # Dodo retries deliveries, so an already-recorded paymentId must not
+        # grant credits twice (only enforceable when the payload carries one)
+        if 'paymentId' in body:
+            update_kwargs['ConditionExpression'] = (
+                'attribute_not_exists(lastPaymentId) OR lastPaymentId <> :paymentId'
+            )
 
-        print(f"✓ Credits updated: {current_credits} → {new_credits} (+{credits_to_add})")
-        print(f"✓ Total lifetime purchases: {new_total_purchased} credits")
+        try:
+            response = ddb_client.update_item(**update_kwargs)
+        except ddb_client.exceptions.ConditionalCheckFailedException:
+            print(f"Duplicate webhook for payment {payment_id}, credits already granted")
+            return {
+                'statusCode': 200,
+                'headers': CORS_HEADERS,
+                'body': orjson.dumps({
+                    'success': True,
+                    'duplicate': True
+                }).decode()
+            }
+        profile_item = {k: _deserializer.deserialize(v) for k, v in response['Attributes'].items()}
 
-        # Convert Decimal types before returning
-        profile_response = decimal_to_number(profile_item)
+        print(f"✓ Credits updated: +{credits_to_add} → {profile_item.get('creditsRemaining')}")
+        print(f"✓ Total lifetime purchases: {profile_item.get('totalCreditsPurchased')} credits")
 
         return {
             'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-            },
-            'body': json.dumps({
+            'headers': CORS_HEADERS,
+            'body': orjson.dumps({
                 'success': True,
-                'profile': profile_response
-            })
+                'profile': profile_item
+            }, default=_decimal_default).decode()
         }
 
     except json.JSONDecodeError:
         return {
             'statusCode': 400,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-            },
-            'body': json.dumps({
+            'headers': CORS_HEADERS,
+            'body': orjson.dumps({
                 'error': 'Invalid JSON in request body'
-            })
+            }).decode()
         }
     except Exception as e:
         print(f"Error updating subscription: {str(e)}")
         return {
             'statusCode': 500,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Headers': 'Content-Type',
-            },
-            'body': json.dumps({
+            'headers': CORS_HEADERS,
+            'body': orjson.dumps({
                 'error': 'Internal server error',
                 'details': str(e)
-            })
+            }).decode()
         }